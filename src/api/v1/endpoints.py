@@ -1,5 +1,6 @@
 from typing import Annotated, Any, Dict
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
 
 # from sqlalchemy import text, func, select
@@ -28,7 +29,7 @@ async def ask_agent(
     request: Request,
 ) -> Any:
     try:
-        body = await request.json()
+        body = orjson.loads(await request.body())
         user_input = body.get("user_input", None)
         thread_id = body.get("thread_id", None)
         if user_input and thread_id:
@@ -117,7 +118,8 @@ async def update_db_from_1c(
     db: Annotated[Session, Depends(get_db)],
 ) -> Dict[str, Any]:
     try:
-        json_data = await request.json()
+        # Сырые байты уходят напрямую в pydantic-core без промежуточного dict
+        json_data = await request.body()
         amount_updated = update_db(db, json_data=json_data if json_data else None)
     except Exception as e:
         if isinstance(e, ValueError):
@@ -1,6 +1,6 @@
 from typing import Any, Dict, List, Optional
 
-from pydantic import BaseModel, Field, model_validator
+from pydantic import BaseModel, Field, field_validator, model_validator
 
 
 class Client(BaseModel):
@@ -28,9 +28,20 @@ class LocationProductSchema(BaseModel):
 
     product: ProductSchema
     location: LocationSchema
-    price: str = Field(description="Цена товара в конкретной аптеке")
+    price: Optional[int] = Field(
+        default=None, description="Цена товара в конкретной аптеке"
+    )
     quantity: int = Field(default=1, description="Количество товара")
 
+    @field_validator("price", mode="before")
+    @classmethod
+    def coerce_price(cls, value: Any) -> Optional[int]:
+        # Нечитаемая цена не валит всю пачку: None фильтруется в update_db
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
     @model_validator(mode="before")
     @classmethod
     def flatten_to_nested(cls, data: Dict[str, Any]) -> Dict[str, Any]:
@@ -45,6 +56,12 @@ class LocationProductSchema(BaseModel):
         }
 
 
+class LocationProductFeedSchema(BaseModel):
+    """Полная выгрузка товаров по аптекам"""
+
+    Products: List[LocationProductSchema]
+
+
 class ItemOrder(BaseModel):
     """Модель товара в заказе"""
 
@@ -0,0 +1,52 @@
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+def ttl_cache(
+    maxsize: int = 1024,
+    ttl: Optional[float] = 600.0,
+    key: Optional[Callable[..., Hashable]] = None,
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    In-process кэш с временем жизни записей.
+
+    :param maxsize: Максимальное число записей (вытесняется самая старая)
+    :param ttl: Время жизни записи в секундах; None — без истечения,
+        только ручная инвалидация через .cache_clear()
+    :param key: (опционально) функция построения ключа из аргументов
+    :return: Декоратор для кэшируемой функции
+    """
+
+    def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+        cache: Dict[Hashable, Tuple[float, Any]] = {}
+        lock = threading.Lock()
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if key is not None:
+                cache_key: Hashable = key(*args, **kwargs)
+            else:
+                cache_key = (args, tuple(sorted(kwargs.items())))
+            now = time.monotonic()
+            with lock:
+                entry = cache.get(cache_key)
+                if entry is not None and (ttl is None or now - entry[0] < ttl):
+                    return entry[1]
+            result = func(*args, **kwargs)
+            with lock:
+                if len(cache) >= maxsize:
+                    oldest = min(cache, key=lambda k: cache[k][0])
+                    del cache[oldest]
+                cache[cache_key] = (now, result)
+            return result
+
+        def cache_clear() -> None:
+            with lock:
+                cache.clear()
+
+        wrapper.cache_clear = cache_clear  # type: ignore[attr-defined]
+        return wrapper
+
+    return decorator
@@ -66,7 +66,7 @@ def find_product_in_vector_store(product_name: str) -> Any:
 def find_all_locations_by_product(product_name: str) -> str | List[str]:
     """Find all locations by product name. Return str or List[str]"""
     locations = get_all_locations_by_product_name(product_name)
-    return [location.address for location in locations]
+    return locations
 
 
 @tool  # type: ignore
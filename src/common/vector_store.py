@@ -53,6 +53,18 @@ class VectorStore:
             return f"Index deletion failed with error: {e}"
         return f"Index {self.config.index_name} deleted successfully."
 
+    def add_products(self, products_names: List[str]) -> str:
+        """Инкрементально добавляет новые названия товаров в индекс
+        без полной перестройки."""
+        try:
+            self.vector_store.add_texts(
+                texts=products_names,
+                namespace=self.config.namespace,
+            )
+        except Exception as e:
+            return f"Error: {e}"
+        return f"Added {len(products_names)} products to index."
+
     def rebuild_vector_store(self, products_names: Optional[List[str]]) -> str:
         self.__delete()
         try:
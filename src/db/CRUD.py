@@ -1,36 +1,95 @@
+import os
 from datetime import datetime
-from typing import Annotated, Any, Dict, List, Optional
+from itertools import islice
+from typing import Annotated, Any, Dict, Iterator, List, Optional, Set, Tuple, Union
 
+import ijson  # type: ignore
 import requests  # type: ignore
 from fastapi import Depends
+from requests.adapters import HTTPAdapter, Retry  # type: ignore
 from pydantic import TypeAdapter
-from sqlalchemy import select, delete
+from sqlalchemy import delete, insert, inspect, select, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import Session
 
-from src.common.Schemas.location_schemas import LocationProductSchema
+from src.common.Schemas.location_schemas import (
+    LocationProductFeedSchema,
+    LocationProductSchema,
+)
+from src.common.cache import ttl_cache
 from src.common.logger import logger
 from src.common.vector_store import vector_store
-from src.db.database import engine, get_db
+from src.db.database import SessionLocal, engine, get_db
 from src.db.Models import Base, Location, LocationProduct, Product
 
+# Адаптер компилируется один раз на модуль, а не на каждый вызов update_db
+_LOCATION_PRODUCTS_ADAPTER: TypeAdapter[List[LocationProductSchema]] = TypeAdapter(
+    List[LocationProductSchema]
+)
+
+# Размер порции при потоковой загрузке выгрузки: пиковая память O(порции)
+_FEED_CHUNK_SIZE = 10_000
+
+# HTTP-сессия с keep-alive и ретраями — без нового TCP/TLS handshake на каждый запрос
+_http = requests.Session()
+_http.mount("https://", HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.3)))
+_http.mount("http://", HTTPAdapter(max_retries=Retry(total=3, backoff_factor=0.3)))
+
+
+def __ensure_indexes() -> None:
+    """
+    Добавляет недостающие индексы на уже существующих таблицах:
+    create_all(checkfirst=True) новые индексы в старые таблицы не добавляет.
+    """
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "CREATE INDEX IF NOT EXISTS ix_products_name_trgm "
+                "ON products USING gin (name gin_trgm_ops)"
+            )
+        )
+        # Старый UNIQUE-констрейнт заменяем покрывающим уникальным индексом,
+        # чтобы get_product_price обслуживался index-only scan
+        conn.execute(
+            text(
+                "ALTER TABLE location_products "
+                'DROP CONSTRAINT IF EXISTS "uix_product_Location"'
+            )
+        )
+        conn.execute(
+            text(
+                'CREATE UNIQUE INDEX IF NOT EXISTS "uix_product_Location" '
+                "ON location_products (product_id, location_id) INCLUDE (price)"
+            )
+        )
+        conn.execute(text("ANALYZE location_products"))
+
 
 def create_db() -> str:
     """
     Создает базу данных и таблицы, если они не существуют.
-    Если база уже существует, ничего не делает.
+    На уже существующей базе доводит индексы до актуальной схемы.
 
     :return: Сообщение о результате операции
     """
+    # Проверяем существование таблиц через инспектор,
+    # а не по тексту исключения
+    existing_tables = set(inspect(engine).get_table_names())
+    tables_exist = set(Base.metadata.tables.keys()).issubset(existing_tables)
     try:
-        Base.metadata.create_all(bind=engine)
+        with engine.begin() as conn:
+            # Расширение для триграммного GIN-индекса по products.name
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+        if not tables_exist:
+            Base.metadata.create_all(bind=engine, checkfirst=True)
+        __ensure_indexes()
     except Exception as exp:
-        if "already exists" in str(exp):
+        logger.error("Failed to create database: %s", exp)
+        raise
+    else:
+        if tables_exist:
             logger.info("Database already exists")
             return "Database already exists"
-        else:
-            logger.error("Failed to create database: %s", exp)
-            raise
-    else:
         return "Database created successfully"
 
 
@@ -53,47 +112,64 @@ def create_db() -> str:
 #         return "Database dropped successfully"
 
 
-def __get_json_from_url(
-    address: str,
-    params: Optional[Dict[Any, Any]] = None,
-    headers: Optional[Dict[Any, Any]] = None,
-) -> Any:
-    """
-    Отправляет GET-запрос по указанному URL и возвращает ответ в формате JSON.
-
-    :param address: URL для запроса
-    :param params: (опционально) параметры запроса
-    :param headers: (опционально) заголовки запроса
-    :return: Ответ в формате dict (JSON)
-    :raises: requests.RequestException, ValueError
-    """
-    response = requests.get(address, params=params, headers=headers)
-    response.raise_for_status()  # выбросит исключение, если код ответа не 2xx
-    return response.json()
-
-
 def __get_location_products_from_json(
-    json_data: Optional[Dict[Any, Any]],
+    json_data: Optional[Union[bytes, Dict[Any, Any]]],
 ) -> List[LocationProductSchema]:
     """
     Получает список LocationProductSchema из JSON-данных.
-    :param json_data: Словарь с ключом "Products", содержащим список продуктов
+    Байты парсятся pydantic-core за один проход (validate_json),
+    словарь — через validate_python.
+    :param json_data: JSON-байты или словарь с ключом "Products"
     :return: Список LocationProductSchema
     """
     if not json_data:
         raise ValueError(
             "JSON data is required. Please provide a valid JSON dictionary."
         )
-    location_products = TypeAdapter(List[LocationProductSchema]).validate_python(
+    if isinstance(json_data, bytes):
+        return LocationProductFeedSchema.model_validate_json(json_data).Products
+    location_products = _LOCATION_PRODUCTS_ADAPTER.validate_python(
         json_data["Products"]
     )
     return location_products
 
 
+def __iter_feed_chunks(
+    json_url: str,
+    json_data: Optional[Union[bytes, Dict[Any, Any]]],
+    chunk_size: int = _FEED_CHUNK_SIZE,
+) -> Iterator[List[LocationProductSchema]]:
+    """
+    Отдает выгрузку порциями по chunk_size штук.
+    URL читается потоково через ijson, поэтому пиковая память зависит
+    от размера порции, а не от размера всей выгрузки.
+    Уже полученные bytes/dict режутся на такие же порции.
+    :param json_url: URL с JSON-данными
+    :param json_data: (опционально) JSON-байты или словарь
+    :param chunk_size: Размер порции
+    :return: Итератор списков LocationProductSchema
+    """
+    if json_data is None:
+        response = _http.get(json_url, stream=True, timeout=(5, 60))
+        response.raise_for_status()
+        # Иначе ijson получит сырые gzip-байты, если сервер сжимает ответ
+        response.raw.decode_content = True
+        items = ijson.items(response.raw, "Products.item")
+        while True:
+            raw_chunk = list(islice(items, chunk_size))
+            if not raw_chunk:
+                break
+            yield _LOCATION_PRODUCTS_ADAPTER.validate_python(raw_chunk)
+        return
+    location_products = __get_location_products_from_json(json_data)
+    for start in range(0, len(location_products), chunk_size):
+        yield location_products[start : start + chunk_size]
+
+
 def update_db(
     db: Annotated[Session, Depends(get_db)],
     json_url: str = "",
-    json_data: Optional[Dict[Any, Any]] = None,
+    json_data: Optional[Union[bytes, Dict[Any, Any]]] = None,
 ) -> int:
     """
     Обновляет базу данных с bulk-операциями для ускорения массовой загрузки.
@@ -103,87 +179,140 @@ def update_db(
     :param db: SQLAlchemy session
     :return: Количество добавленных записей
     """
-    if not json_data:
-        json_data = __get_json_from_url(json_url)
-    pydantic_list_of_products = __get_location_products_from_json(json_data)
-    counter = 0
-
-    # Загружаем все существующие продукты и аптеки в память через scalars
-    products = db.scalars(select(Product)).all()
-    locations = db.scalars(select(Location)).all()
-    existing_products = {p.name: p.id for p in products}
-    existing_locations = {p.address: p.id for p in locations}
-
-    # Собираем новые продукты и аптеки, исключая дубликаты внутри пачки
-    new_product_names = set()
-    new_location_addresses = set()
-    new_products = []
-    new_locations = []
-
-    for item in pydantic_list_of_products:
-        p_name = item.product.name
-        ph_addr = item.location.address
-        if p_name not in existing_products and p_name not in new_product_names:
-            new_products.append(Product(name=p_name))
-            new_product_names.add(p_name)
-        if ph_addr not in existing_locations and ph_addr not in new_location_addresses:
-            new_locations.append(Location(address=ph_addr))
-            new_location_addresses.add(ph_addr)
-
-    # Bulk insert новых продуктов и аптек
-    if new_products:
-        db.bulk_save_objects(new_products)
-    if new_locations:
-        db.bulk_save_objects(new_locations)
-    db.commit()
-
-    # Обновим словари id через scalars
-    products = db.scalars(select(Product)).all()
-    locations = db.scalars(select(Location)).all()
-    existing_products = {p.name: p.id for p in products}
-    existing_locations = {p.address: p.id for p in locations}
-
-    # Очищаем таблицу LocationProduct
-    db.execute(delete(LocationProduct))
-    db.commit()
-
-    # Формируем уникальные связи
-    seen_links = set()
-    pharm_prod_prices = []
-
-    for item in pydantic_list_of_products:
-        try:
-            price_product = int(item.price)
-        except Exception as exp:
-            logger.error("Price error: %s | Product: %s", exp, item)
-            continue
-
-        p_name = item.product.name.strip()
-        ph_addr = item.location.address.strip()
-        product_id = existing_products.get(p_name)
-        location_id = existing_locations.get(ph_addr)
-
-        if not product_id or not location_id:
-            continue
-
-        key = (product_id, location_id)
-        if key in seen_links:
-            continue  # Пропускаем дубликаты
-        seen_links.add(key)
-
-        pharm_prod_prices.append(
-            LocationProduct(
-                product_id=product_id, location_id=location_id, price=price_product
-            )
-        )
-        counter += 1
-    if pharm_prod_prices:
-        db.bulk_save_objects(pharm_prod_prices)
-    db.commit()
+    invalid_prices = 0
+    new_product_names: Set[str] = set()
+    all_links: Set[Tuple[int, int]] = set()
 
-    # Обновление vector store по понедельникам с 4-5 утра
+    # Все мутации — в одной транзакции: один fsync и атомарный откат
+    try:
+        for chunk in __iter_feed_chunks(json_url, json_data):
+            # Цена приведена к int еще на этапе pydantic-валидации;
+            # строки с нечитаемой ценой отбрасываются одним проходом
+            chunk_invalid = sum(1 for i in chunk if i.price is None)
+            if chunk_invalid:
+                invalid_prices += chunk_invalid
+                chunk = [i for i in chunk if i.price is not None]
+
+            # Загружаем id только тех продуктов и аптек, что встречаются
+            # в порции, кортежами без ORM-гидратации
+            batch_product_names = {i.product.name.strip() for i in chunk}
+            batch_location_addresses = {i.location.address.strip() for i in chunk}
+            existing_products = {
+                name: product_id
+                for product_id, name in db.execute(
+                    select(Product.id, Product.name).where(
+                        Product.name.in_(batch_product_names)
+                    )
+                )
+            }
+            existing_locations = {
+                address: location_id
+                for location_id, address in db.execute(
+                    select(Location.id, Location.address).where(
+                        Location.address.in_(batch_location_addresses)
+                    )
+                )
+            }
+
+            # Новые имена и адреса — одной разностью множеств
+            chunk_new_names = batch_product_names - existing_products.keys()
+            chunk_new_addresses = batch_location_addresses - existing_locations.keys()
+
+            # Bulk insert новых продуктов и аптек через Core insert
+            # (insertmanyvalues); RETURNING сразу отдает новые id —
+            # без повторного SELECT всей таблицы
+            if chunk_new_names:
+                result = db.execute(
+                    insert(Product).returning(Product.id, Product.name),
+                    [{"name": name} for name in chunk_new_names],
+                )
+                existing_products.update(
+                    {name: product_id for product_id, name in result}
+                )
+                new_product_names |= chunk_new_names
+            if chunk_new_addresses:
+                result = db.execute(
+                    insert(Location).returning(Location.id, Location.address),
+                    [{"address": address} for address in chunk_new_addresses],
+                )
+                existing_locations.update(
+                    {address: location_id for location_id, address in result}
+                )
+
+            # Дедупликация через dict по ключу (product_id, location_id):
+            # поздний дубликат перезаписывает ранний — актуальная цена выигрывает
+            links: Dict[Tuple[int, int], Dict[str, Any]] = {}
+
+            for item in chunk:
+                product_id = existing_products.get(item.product.name.strip())
+                location_id = existing_locations.get(item.location.address.strip())
+
+                if not product_id or not location_id:
+                    continue
+
+                links[(product_id, location_id)] = {
+                    "product_id": product_id,
+                    "location_id": location_id,
+                    "price": item.price,
+                }
+
+            # Upsert вместо полной перезаписи таблицы:
+            # пишем только реальные изменения
+            if links:
+                upsert_stmt = pg_insert(LocationProduct)
+                upsert_stmt = upsert_stmt.on_conflict_do_update(
+                    index_elements=["product_id", "location_id"],
+                    set_={"price": upsert_stmt.excluded.price},
+                )
+                db.execute(upsert_stmt, list(links.values()))
+                all_links |= links.keys()
+
+        # Удаляем связи, которых больше нет в выгрузке
+        current_links = {
+            (product_id, location_id)
+            for product_id, location_id in db.execute(
+                select(LocationProduct.product_id, LocationProduct.location_id)
+            )
+        }
+        stale_links = current_links - all_links
+        if stale_links:
+            db.execute(
+                delete(LocationProduct).where(
+                    tuple_(LocationProduct.product_id, LocationProduct.location_id).in_(
+                        stale_links
+                    )
+                )
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if invalid_prices:
+        logger.error("Skipped %d items with unparsable price", invalid_prices)
+    counter = len(all_links)
+
+    # Сбрасываем кэши чтения — данные в БД изменились
+    get_all_locations_by_product_name.cache_clear()  # type: ignore[attr-defined]
+    get_product_price.cache_clear()  # type: ignore[attr-defined]
+    get_products_by_name.cache_clear()  # type: ignore[attr-defined]
+    get_all_products.cache_clear()  # type: ignore[attr-defined]
+
+    # Инкрементальное обновление vector store: только новые продукты,
+    # без еженедельной полной перестройки
+    if new_product_names:
+        logger.info("Adding %d new products to vector store", len(new_product_names))
+        status_update = vector_store.add_products(list(new_product_names))
+        logger.info("Vector store update status: %s", status_update)
+
+    # Полная перестройка оставлена как страховка по понедельникам 4-5 утра,
+    # но только если явно включена переменной окружения
     now = datetime.now()
-    if now.weekday() == 0 and (4 <= now.hour <= 5):
+    if (
+        os.getenv("VECTOR_STORE_FULL_REBUILD", "").lower() == "true"
+        and now.weekday() == 0
+        and (4 <= now.hour <= 5)
+    ):
         logger.info("Starting to rebuild vector store")
         status_update = update_vector_store()
         logger.info("Vector store rebuilt status: %s", status_update)
@@ -191,28 +320,41 @@ def update_db(
     return counter
 
 
+@ttl_cache(maxsize=1024, ttl=600, key=lambda product_name: product_name.strip().lower())
 def get_all_locations_by_product_name(product_name: str) -> Any:
     """
     Поиск аптек по названию продукта
     :param product_name: Название продукта
     :return: Список аптек
     """
-    db = next(get_db())
-    # Поиск id продукта по имени
-
-    product = db.scalar(select(Product).where(Product.name.ilike(f"%{product_name}%")))
-    if not product:
-        return []
-    # Поиск аптеки, где есть этот продукт
-    query = (
-        select(Location)
-        .join(LocationProduct, Location.id == LocationProduct.location_id)
-        .where(LocationProduct.product_id == product.id)
-    )
-    locations = db.scalars(query).all()
-    return locations
-
-
+    with SessionLocal() as db:
+        # Поиск id продукта по имени
+        product_id = db.scalar(
+            select(Product.id).where(Product.name.ilike(f"%{product_name}%"))
+        )
+        if not product_id:
+            return []
+        # Адреса аптек, где есть этот продукт, без ORM-гидратации
+        query = (
+            select(Location.address)
+            .join(LocationProduct, Location.id == LocationProduct.location_id)
+            .where(LocationProduct.product_id == product_id)
+        )
+        addresses = db.scalars(query).all()
+        return list(addresses)
+
+
+# Цены живут до следующего update_db (ручная инвалидация).
+# Имя в ключе нормализуется как в ILIKE-запросе; адрес сравнивается
+# в запросе точно, поэтому в ключе регистр сохраняем
+@ttl_cache(
+    maxsize=4096,
+    ttl=None,
+    key=lambda product_name, location_address: (
+        product_name.strip().lower(),
+        location_address.strip(),
+    ),
+)
 def get_product_price(product_name: str, location_address: str) -> Any:
     """
     Поиск цены продукта в конкретной аптеке
@@ -220,40 +362,39 @@ def get_product_price(product_name: str, location_address: str) -> Any:
     :param location_address: Адрес аптеки
     :return: Цена продукта или None, если не найдено
     """
-    db = next(get_db())
-    product = db.scalar(select(Product).where(Product.name.ilike(f"%{product_name}%")))
-    if not product:
-        return None
-    location = db.scalar(select(Location).where(Location.address == location_address))
-    if not location:
-        return None
-    location_product = db.scalar(
-        select(LocationProduct).where(
-            LocationProduct.product_id == product.id,
-            LocationProduct.location_id == location.id,
+    with SessionLocal() as db:
+        # Один join-запрос вместо трех последовательных round-trip'ов
+        price = db.scalar(
+            select(LocationProduct.price)
+            .join(Product, Product.id == LocationProduct.product_id)
+            .join(Location, Location.id == LocationProduct.location_id)
+            .where(
+                Product.name.ilike(f"%{product_name.strip()}%"),
+                Location.address == location_address.strip(),
+            )
         )
-    )
-    if not location_product:
-        return None
-    return location_product.price
+        return price
 
 
+@ttl_cache(maxsize=1024, ttl=600, key=lambda product_name: product_name.strip().lower())
 def get_products_by_name(product_name: str) -> Optional[List[str]]:
-    db = next(get_db())
-    products = db.scalars(
-        select(Product).where(Product.name.ilike(f"%{product_name.lower()}%"))
-    )
-    if products:
-        return [product.name for product in products]
-    return None
+    with SessionLocal() as db:
+        names = db.scalars(
+            select(Product.name).where(Product.name.ilike(f"%{product_name.lower()}%"))
+        ).all()
+        if names:
+            return list(names)
+        return None
 
 
+# Полный список продуктов живет до следующего update_db (ручная инвалидация)
+@ttl_cache(maxsize=1, ttl=None, key=lambda: "all_products")
 def get_all_products() -> Optional[List[str]]:
-    db = next(get_db())
-    products = db.scalars(select(Product)).all()
-    if products:
-        return [product.name for product in products]
-    return None
+    with SessionLocal() as db:
+        names = db.scalars(select(Product.name)).all()
+        if names:
+            return list(names)
+        return None
 
 
 def update_vector_store() -> Any:
@@ -1,4 +1,4 @@
-from sqlalchemy import ForeignKey, UniqueConstraint
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 
@@ -23,6 +23,16 @@ class Product(Base):
     # Связь с таблицей LocationProduct
     location_products = relationship("LocationProduct", back_populates="product")
 
+    # Триграммный GIN-индекс, чтобы ILIKE '%...%' не делал sequential scan
+    __table_args__ = (
+        Index(
+            "ix_products_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
+
     def __repr__(self) -> str:
         return f"<Product(id={self.id}, name={self.name})>"
 
@@ -30,16 +40,22 @@ class Product(Base):
 class LocationProduct(Base):
     __tablename__ = "location_products"
     product_id: Mapped[int] = mapped_column(ForeignKey("products.id"), nullable=False)
-    location_id: Mapped[int] = mapped_column(
-        ForeignKey("locations.id"), nullable=False
-    )
+    location_id: Mapped[int] = mapped_column(ForeignKey("locations.id"), nullable=False)
     price: Mapped[int] = mapped_column(nullable=False)
 
     product = relationship("Product", back_populates="location_products")
     location = relationship("Location", back_populates="location_products")
 
+    # Покрывающий индекс: поиск цены по (product_id, location_id)
+    # обслуживается index-only scan без обращения к heap
     __table_args__ = (
-        UniqueConstraint("product_id", "location_id", name="uix_product_Location"),
+        Index(
+            "uix_product_Location",
+            "product_id",
+            "location_id",
+            unique=True,
+            postgresql_include=["price"],
+        ),
     )
 
     def __repr__(self) -> str:
@@ -7,7 +7,11 @@ from src.settings.db_settings import settings
 
 # Sync version
 engine = create_engine(
-    url=settings.SYNC_DATABASE_URL, echo=True, pool_size=100, max_overflow=15
+    url=settings.SYNC_DATABASE_URL,
+    echo=True,
+    pool_size=100,
+    max_overflow=15,
+    insertmanyvalues_page_size=10_000,
 )
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 